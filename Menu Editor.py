@@ -1,5 +1,18 @@
+import argparse
+import bisect
+import hashlib
+import os
+import re
 import sys
 import json
+import stat
+import struct
+import tempfile
+import textwrap
+import time
+import uuid
+import zipfile
+import zlib
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
     QFormLayout, QLabel, QLineEdit, QPushButton, QComboBox, 
@@ -9,6 +22,1132 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QStandardItemModel, QStandardItem, QPixmap
 
+# Folder inside a .miz archive that holds the mission's scripts and resources
+MIZ_RESOURCE_DIR = "l10n/DEFAULT/"
+MIZ_SCRIPT_NAME = "RadioMenu.lua"
+MIZ_TRIGGER_COMMENT = "Radio Menu"
+
+LUA_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--\[(?P<ceq>=*)\[.*?\](?P=ceq)\]|--[^\n]*)
+  | (?P<longstring>\[(?P<leq>=*)\[.*?\](?P=leq)\])
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op>\.\.\.|\.\.|==|~=|<=|>=|::|[-+*/%^\#<>=(){}\[\];:,.])
+""", re.VERBOSE | re.DOTALL)
+
+LUA_ESCAPE_RE = re.compile(r"\\(\d{1,3}|.)", re.DOTALL)
+LUA_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'a': '\a', 'b': '\b',
+               'f': '\f', 'v': '\v', '\n': '\n'}
+
+def tokenize_lua(text):
+    """Yield (kind, text, start, end) for each Lua token, skipping whitespace and comments"""
+    match = LUA_TOKEN_RE.match
+    pos = 0
+    length = len(text)
+    while pos < length:
+        m = match(text, pos)
+        if m is None:
+            raise ValueError(f"Unexpected character {text[pos]!r} at offset {pos}")
+        kind = m.lastgroup
+        pos = m.end()
+        if kind == 'space' or kind == 'comment':
+            continue
+        if kind == 'longstring':
+            kind = 'string'
+        yield kind, m.group(), m.start(), pos
+
+def lua_string_value(token):
+    """Decode a quoted or long-bracket Lua string literal"""
+    if token[0] == '[':
+        level = token.index('[', 1) + 1
+        body = token[level:-level]
+        return body[1:] if body.startswith('\n') else body
+
+    def unescape(m):
+        esc = m.group(1)
+        if esc.isdigit():
+            return chr(int(esc))
+        return LUA_ESCAPES.get(esc, esc)
+
+    return LUA_ESCAPE_RE.sub(unescape, token[1:-1])
+
+def lua_quote(value):
+    """Quote a string the way Lua's %q format does"""
+    value = (value.replace('\\', '\\\\').replace('"', '\\"')
+             .replace('\n', '\\\n').replace('\r', '\\r').replace('\0', '\\000'))
+    return f'"{value}"'
+
+def lua_number_value(token):
+    if token[:2] in ('0x', '0X'):
+        return int(token, 16)
+    if any(c in token for c in '.eE'):
+        return float(token)
+    return int(token)
+
+class LuaTableParser:
+    """Parse the serialized Lua tables DCS stores in mission files"""
+
+    def __init__(self, text):
+        self.tokens = list(tokenize_lua(text))
+        self.pos = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None, None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise ValueError("Unexpected end of Lua data")
+        self.pos += 1
+        return token
+
+    def expect(self, text):
+        token = self.next()
+        if token[1] != text:
+            raise ValueError(f"Expected '{text}' at offset {token[2]}, found '{token[1]}'")
+        return token
+
+    def parse_assignment(self):
+        """Parse `name = value` and return (name, value)"""
+        kind, name, start, _ = self.next()
+        if kind != 'name':
+            raise ValueError(f"Expected a variable name at offset {start}")
+        self.expect('=')
+        value = self.parse_value()
+        if self.peek()[0] is not None:
+            raise ValueError(f"Unexpected data after '{name}' at offset {self.peek()[2]}")
+        return name, value
+
+    def parse_value(self):
+        kind, text, start, _ = self.next()
+        if kind == 'string':
+            return lua_string_value(text)
+        if kind == 'number':
+            return lua_number_value(text)
+        if text == '-' and self.peek()[0] == 'number':
+            return -lua_number_value(self.next()[1])
+        if text == 'true':
+            return True
+        if text == 'false':
+            return False
+        if text == 'nil':
+            return None
+        if text == '{':
+            return self.parse_table()
+        raise ValueError(f"Unsupported Lua value '{text}' at offset {start}")
+
+    def parse_table(self):
+        table = {}
+        index = 1
+        while self.peek()[1] != '}':
+            kind, text, _, _ = self.peek()
+            if text == '[':
+                self.next()
+                key = self.parse_value()
+                self.expect(']')
+                self.expect('=')
+            elif kind == 'name' and self.tokens[self.pos + 1:self.pos + 2] and \
+                    self.tokens[self.pos + 1][1] == '=':
+                key = text
+                self.pos += 2
+            else:
+                key = index
+                index += 1
+            table[key] = self.parse_value()
+            if self.peek()[1] in (',', ';'):
+                self.next()
+        self.expect('}')
+        return table
+
+def dump_lua_assignment(name, value):
+    """Serialize `name = value` in the layout the DCS Mission Editor writes"""
+    parts = [f"{name} = "]
+    _dump_lua_value(value, "", parts)
+    parts.append(f" -- end of {name}\n")
+    return "".join(parts)
+
+def _dump_lua_value(value, indent, parts):
+    if isinstance(value, dict):
+        inner = indent + "    "
+        parts.append(f"\n{indent}{{\n")
+        for key, item in value.items():
+            key_str = f"[{key}]" if isinstance(key, int) else f"[{lua_quote(key)}]"
+            parts.append(f"{inner}{key_str} = ")
+            _dump_lua_value(item, inner, parts)
+            if isinstance(item, dict):
+                parts.append(f", -- end of {key_str}\n")
+            else:
+                parts.append(",\n")
+        parts.append(f"{indent}}}")
+    elif isinstance(value, bool):
+        parts.append("true" if value else "false")
+    elif isinstance(value, (int, float)):
+        parts.append(repr(value))
+    elif isinstance(value, str):
+        parts.append(lua_quote(value))
+    else:
+        parts.append("nil")
+
+def _read_miz_table(archive, entry, default_name):
+    """Return (name, table) for a Lua table stored in the mission archive"""
+    if entry not in archive.NameToInfo:
+        return default_name, {}
+    text = archive.read(entry).decode('utf-8-sig')
+    return LuaTableParser(text).parse_assignment()
+
+def _add_script_trigger(archive, script_name):
+    """Return the rewritten entries needed for a MISSION START trigger that loads the script"""
+    map_entry = MIZ_RESOURCE_DIR + "mapResource"
+    map_name, resources = _read_miz_table(archive, map_entry, "mapResource")
+    mission_name, mission = _read_miz_table(archive, "mission", "mission")
+    if not mission:
+        raise ValueError("The archive does not contain a mission")
+
+    res_key = next((key for key, value in resources.items() if value == script_name), None)
+    trigrules = mission.setdefault('trigrules', {})
+    if res_key is not None:
+        # Nothing to do if a trigger already loads this script
+        for rule in trigrules.values():
+            for action in rule.get('actions', {}).values():
+                if action.get('predicate') == "a_do_script_file" and action.get('file') == res_key:
+                    return {}
+    else:
+        # New resource keys continue the mission's dictionary counter
+        used_ids = [mission.get('maxDictId', 0)]
+        for key in resources:
+            suffix = str(key).rsplit('_', 1)[-1]
+            if suffix.isdigit():
+                used_ids.append(int(suffix))
+        dict_id = max(used_ids) + 1
+        if 'maxDictId' in mission:
+            mission['maxDictId'] = dict_id
+        res_key = f"ResKey_Action_{dict_id}"
+        resources[res_key] = script_name
+
+    index = max((key for key in trigrules if isinstance(key, int)), default=0) + 1
+    trigrules[index] = {
+        'rules': {},
+        'comment': MIZ_TRIGGER_COMMENT,
+        'eventlist': "",
+        'predicate': "triggerStart",
+        'actions': {
+            1: {
+                'predicate': "a_do_script_file",
+                'file': res_key,
+                'ai_task': {1: "", 2: ""},
+            },
+        },
+    }
+
+    # The compiled trigger tables are what the simulator actually runs
+    trig = mission.setdefault('trig', {})
+    for section in ('actions', 'events', 'custom', 'func', 'flag',
+                    'conditions', 'customStartup', 'funcStartup'):
+        trig.setdefault(section, {})
+    trig['actions'][index] = f'a_do_script_file(getValueResourceByKey("{res_key}"));'
+    trig['conditions'][index] = "return(true)"
+    trig['flag'][index] = True
+    trig['funcStartup'][index] = (f"if mission.trig.conditions[{index}]() then "
+                                  f"mission.trig.actions[{index}]() end")
+
+    return {
+        "mission": dump_lua_assignment(mission_name, mission).encode('utf-8'),
+        map_entry: dump_lua_assignment(map_name, resources).encode('utf-8'),
+    }
+
+def _copy_bytes(src, dst, length, chunk_size=1024 * 1024):
+    while length > 0:
+        chunk = src.read(min(chunk_size, length))
+        if not chunk:
+            raise zipfile.BadZipFile("Unexpected end of archive")
+        dst.write(chunk)
+        length -= len(chunk)
+
+def _check_zip32(*values):
+    if any(value >= 0xFFFFFFFF for value in values):
+        raise ValueError("Zip64 mission archives are not supported")
+
+def _copy_raw_entry(raw, info, out):
+    """Copy an entry's local header and compressed data without decompressing it"""
+    _check_zip32(info.compress_size, info.file_size, info.header_offset)
+    raw.seek(info.header_offset)
+    header = raw.read(zipfile.sizeFileHeader)
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    if fields[0] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+    name = raw.read(fields[10])
+    length = zipfile.sizeFileHeader + fields[10] + fields[11] + info.compress_size
+    if info.flag_bits & 0x08:
+        # A data descriptor follows the data, with or without its signature
+        raw.seek(info.header_offset + length)
+        length += 16 if raw.read(4) == b"PK\x07\x08" else 12
+
+    offset = out.tell()
+    raw.seek(info.header_offset)
+    _copy_bytes(raw, out, length)
+    return (info.create_version, info.create_system, info.extract_version,
+            info.reserved, info.flag_bits, info.compress_type, info.date_time,
+            info.CRC, info.compress_size, info.file_size, name, info.extra,
+            info.comment, info.internal_attr, info.external_attr, offset)
+
+def _write_new_entry(out, filename, data):
+    """Write a freshly deflated entry and return its central directory record"""
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    try:
+        name = filename.encode('ascii')
+        flag_bits = 0
+    except UnicodeEncodeError:
+        name = filename.encode('utf-8')
+        flag_bits = 0x800
+    date_time = time.localtime()[:6]
+    crc = zlib.crc32(data)
+    dostime, dosdate = _dos_time(date_time)
+
+    offset = out.tell()
+    out.write(struct.pack(zipfile.structFileHeader, zipfile.stringFileHeader,
+                          20, 0, flag_bits, zipfile.ZIP_DEFLATED, dostime, dosdate,
+                          crc, len(compressed), len(data), len(name), 0))
+    out.write(name)
+    out.write(compressed)
+    return (20, 0, 20, 0, flag_bits, zipfile.ZIP_DEFLATED, date_time, crc,
+            len(compressed), len(data), name, b"", b"", 0, 0o644 << 16, offset)
+
+def _dos_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11 | minute << 5 | second // 2,
+            (year - 1980) << 9 | month << 5 | day)
+
+def _write_central_directory(out, records, comment):
+    start = out.tell()
+    for (create_version, create_system, extract_version, reserved, flag_bits,
+         compress_type, date_time, crc, compress_size, file_size, name, extra,
+         file_comment, internal_attr, external_attr, offset) in records:
+        _check_zip32(offset)
+        dostime, dosdate = _dos_time(date_time)
+        out.write(struct.pack(zipfile.structCentralDir, zipfile.stringCentralDir,
+                              create_version, create_system, extract_version, reserved,
+                              flag_bits, compress_type, dostime, dosdate, crc,
+                              compress_size, file_size, len(name), len(extra),
+                              len(file_comment), 0, internal_attr, external_attr, offset))
+        out.write(name)
+        out.write(extra)
+        out.write(file_comment)
+    size = out.tell() - start
+    _check_zip32(start, size)
+    if len(records) > 0xFFFF:
+        raise ValueError("Zip64 mission archives are not supported")
+    out.write(struct.pack(zipfile.structEndArchive, zipfile.stringEndArchive,
+                          0, 0, len(records), len(records), size, start, len(comment)))
+    out.write(comment)
+
+def inject_lua_into_miz(miz_path, script_name, lua_code, add_trigger=True):
+    """Add or replace a script inside a .miz archive.
+
+    Every other entry is copied in its compressed form and the finished
+    archive atomically replaces the original.
+    """
+    script_entry = MIZ_RESOURCE_DIR + script_name
+    directory = os.path.dirname(os.path.abspath(miz_path))
+    fd, temp_path = tempfile.mkstemp(suffix=".miz", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as out, zipfile.ZipFile(miz_path) as archive, \
+                open(miz_path, 'rb') as raw:
+            new_entries = {script_entry: lua_code.encode('utf-8')}
+            if add_trigger:
+                new_entries.update(_add_script_trigger(archive, script_name))
+
+            records = []
+            for info in archive.infolist():
+                if info.filename in new_entries:
+                    # Keep rewritten entries in their original position
+                    data = new_entries.pop(info.filename)
+                    records.append(_write_new_entry(out, info.filename, data))
+                else:
+                    records.append(_copy_raw_entry(raw, info, out))
+            for filename, data in new_entries.items():
+                records.append(_write_new_entry(out, filename, data))
+            _write_central_directory(out, records, archive.comment)
+
+            out.flush()
+            os.fsync(out.fileno())
+        os.chmod(temp_path, stat.S_IMODE(os.stat(miz_path).st_mode))
+        os.replace(temp_path, miz_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def generate_lua_code(menus, commands):
+    """Build the radio menu script for the given menus and commands"""
+    lua_code = "-- Radio Menu Structure\n\n"
+    
+    # Helper function to get all commands for a specific menu
+    def get_menu_commands(menu_id):
+        return [cmd for cmd in commands if cmd['menu_id'] == menu_id]
+
+    # Helper function to get direct submenus of a menu
+    def get_direct_submenus(parent_id):
+        return [menu for menu in menus if menu[2] == parent_id]
+
+    # Helper function to generate menu and its commands recursively
+    def generate_menu_code(menu_data, processed_menus=None):
+        if processed_menus is None:
+            processed_menus = set()
+
+        menu_id, menu_name, submenu, coalition = menu_data
+        
+        # Skip if already processed
+        if menu_id in processed_menus:
+            return ""
+        
+        processed_menus.add(menu_id)
+        code = ""
+        
+        # Add the menu definition
+        coalition_str = f"coalition.side.{coalition.upper()}"
+        code += f"local {menu_id} = missionCommands.addSubMenuForCoalition({coalition_str}, \"{menu_name}\", {submenu})\n"
+        
+        # Add commands for this menu
+        menu_commands = get_menu_commands(menu_id)
+        for command in menu_commands:
+            if command['type'] == "Set Flag":
+                flag = command['flag']
+                # If flag can be converted to int, use it as is, otherwise keep as string
+                try:
+                    flag = int(flag)
+                    flag_str = str(flag)  # No quotes for numbers
+                except ValueError:
+                    flag_str = f"\"{flag}\""  # Quotes for strings
+                
+                code += (f"missionCommands.addCommandForCoalition({coalition_str}, "
+                        f"\"{command['name']}\", {menu_id}, function() "
+                        f"trigger.action.setUserFlag({flag_str}, {command['value']}); "
+                        f"timer.scheduleFunction(function() trigger.action.setUserFlag({flag_str}, 0) end, nil, timer.getTime() + 1) end)\n")
+            else:  # Custom Code
+                code += (f"missionCommands.addCommandForCoalition({coalition_str}, "
+                        f"\"{command['name']}\", {menu_id}, function() {command['code']} end)\n")
+        
+        # Process submenus
+        submenus = get_direct_submenus(menu_id)
+        for submenu in submenus:
+            code += generate_menu_code(submenu, processed_menus)
+        
+        return code
+
+    # Start with top-level menus (those with submenu="nil")
+    top_level_menus = [menu for menu in menus if menu[2] == "nil"]
+    
+    # Add menus section
+    lua_code += "-- Menus\n"
+    for menu in top_level_menus:
+        lua_code += generate_menu_code(menu)
+
+    return lua_code
+
+LUA_BLOCK_OPENERS = {'function', 'do', 'if', 'repeat', '(', '{', '['}
+LUA_BLOCK_CLOSERS = {'end', 'until', ')', '}', ']'}
+LUA_COALITIONS = {'BLUE': 'blue', 'RED': 'red'}
+# Numeric values of coalition.side.RED and coalition.side.BLUE
+LUA_COALITION_NUMBERS = {1: 'red', 2: 'blue'}
+
+# Body of the flag command emitted by generate_lua_code
+FLAG_PULSE_PATTERN = (
+    "trigger . action . setUserFlag ( {flag} , {value} ) ; "
+    "timer . scheduleFunction ( function ( ) trigger . action . setUserFlag ( {flag} , 0 ) end , "
+    "nil , timer . getTime ( ) + 1 )"
+).split()
+
+# Tokens after which a statement cannot end, so the next token still belongs to it
+LUA_CONTINUATIONS = {
+    '.', ':', ',', '=', '(', '[', '{', '+', '-', '*', '/', '%', '^', '#', '..',
+    '==', '~=', '<', '>', '<=', '>=', '::', 'and', 'or', 'not', 'return', 'local',
+    'function', 'then', 'do', 'else', 'elseif', 'in', 'until', 'while', 'if',
+    'for', 'repeat', 'goto'
+}
+
+def _block_delta(token):
+    kind, text = token[0], token[1]
+    if kind == 'string' or kind == 'number':
+        return 0
+    if text in LUA_BLOCK_OPENERS:
+        return 1
+    if text in LUA_BLOCK_CLOSERS:
+        return -1
+    return 0
+
+def _referenced_names(code):
+    """Names a piece of Lua code reads without declaring them itself"""
+    referenced = set()
+    declared = set()
+    previous = None
+    for kind, text, _, _ in tokenize_lua(code):
+        if kind == 'name' and previous not in ('.', ':'):
+            if previous in ('local', 'function', 'for'):
+                declared.add(text)
+            else:
+                referenced.add(text)
+        previous = text if kind in ('name', 'op') else None
+    return referenced - declared
+
+class LuaMenuImporter:
+    """Rebuild menus and commands from a radio menu Lua script in a single pass.
+
+    Tokens are pulled from tokenize_lua on demand and only the current
+    statement is kept in the lookahead buffer.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.stream = tokenize_lua(text)
+        self.buffer = []
+        self.buffer_start = 0
+        self.menus = []
+        self.commands = []
+        self.menu_ids = set()
+        # Current menu ID for each Lua variable holding a menu
+        self.bindings = {}
+        # Unrecognized code seen before the first menu is defined
+        self.pending_code = []
+        self.imported_code_count = 0
+        # Names defined by each "Imported Code" command, by command index
+        self.wrapped_commands = {}
+        # Top-level definitions that end up inside "Imported Code" commands
+        self.wrapped_names = set()
+        self.chunk_names = set()
+        self.functions = {}
+        self.open_function = None
+        self.warnings = []
+
+    def token(self, i):
+        while i - self.buffer_start >= len(self.buffer):
+            token = next(self.stream, None)
+            if token is None:
+                return None
+            self.buffer.append(token)
+        return self.buffer[i - self.buffer_start]
+
+    def release(self, i):
+        """Drop buffered tokens before index i"""
+        del self.buffer[:i - self.buffer_start]
+        self.buffer_start = i
+
+    def text_at(self, i):
+        token = self.token(i)
+        return token[1] if token else None
+
+    def kind_at(self, i):
+        token = self.token(i)
+        return token[0] if token else None
+
+    def match_sequence(self, i, texts):
+        """Return the index after `texts` if the tokens at i match them, else None"""
+        for text in texts:
+            if self.text_at(i) != text:
+                return None
+            i += 1
+        return i
+
+    def run(self):
+        pos = 0
+        depth = 0
+        code_start = code_end = None
+        at_statement_start = True
+        while self.token(pos) is not None:
+            if depth == 0 and at_statement_start:
+                matched = self.match_menu(pos) or self.match_command(pos)
+                if matched:
+                    if code_start is not None:
+                        self.add_custom_code(self.text[code_start:code_end])
+                        code_start = None
+                    pos, item = matched
+                    if isinstance(item, tuple):
+                        self.menus.append(item)
+                        self.flush_pending_code()
+                    else:
+                        self.commands.append(item)
+                    self.release(pos)
+                    continue
+                self.note_definition(pos)
+
+            kind, text, start, end = self.token(pos)
+            if code_start is None:
+                code_start = start
+            code_end = end
+            if text == ')' and self.open_function and self.open_function[2] is None:
+                self.open_function[2:] = [start, end]
+            depth = max(0, depth + _block_delta(self.token(pos)))
+            if depth == 0 and text == 'end' and self.open_function:
+                self.close_function(start)
+            at_statement_start = kind in ('string', 'number') or text not in LUA_CONTINUATIONS
+            pos += 1
+            self.release(pos)
+        if code_start is not None:
+            self.add_custom_code(self.text[code_start:code_end])
+        if not self.menus:
+            raise ValueError("No radio menus found in the script")
+        self.check_wrapped_references()
+        return self.menus, self.commands, self.warnings
+
+    def note_definition(self, i):
+        """Remember names a top-level statement at i defines"""
+        is_local = self.text_at(i) == 'local'
+        if is_local:
+            i += 1
+        if self.text_at(i) == 'function':
+            if self.kind_at(i + 1) == 'name' and self.text_at(i + 2) == '(':
+                self.chunk_names.add(self.text_at(i + 1))
+                # [name, parameters start, parameters end, body start] as text offsets
+                self.open_function = [self.text_at(i + 1), self.token(i + 2)[3], None, None]
+            return
+        names = []
+        while self.kind_at(i) == 'name' and self.text_at(i) not in LUA_CONTINUATIONS:
+            names.append(self.text_at(i))
+            if self.text_at(i + 1) != ',':
+                break
+            i += 2
+        if is_local or self.text_at(i + 1) == '=':
+            self.chunk_names.update(names)
+
+    def close_function(self, body_end):
+        name, params_start, params_end, body_start = self.open_function
+        self.open_function = None
+        if params_end is not None:
+            self.functions[name] = (self.text[params_start:params_end], self.text[body_start:body_end])
+
+    def match_coalition(self, i):
+        """Match `coalition.side.X` or its number and return (coalition, next index)"""
+        if self.kind_at(i) == 'number':
+            coalition = LUA_COALITION_NUMBERS.get(lua_number_value(self.text_at(i)))
+            return (coalition, i + 1) if coalition else (None, None)
+        i = self.match_sequence(i, ('coalition', '.', 'side', '.'))
+        if i is None or self.text_at(i) not in LUA_COALITIONS:
+            return None, None
+        return LUA_COALITIONS[self.text_at(i)], i + 1
+
+    def match_end_of_call(self, i):
+        if self.text_at(i) != ')':
+            return None
+        i += 1
+        if self.text_at(i) == ';':
+            i += 1
+        return i
+
+    def match_menu(self, i):
+        """Match `local ID = missionCommands.addSubMenuForCoalition(side, "Name", parent)`"""
+        if self.text_at(i) == 'local':
+            i += 1
+        if self.kind_at(i) != 'name' or self.text_at(i + 1) != '=':
+            return None
+        variable = self.text_at(i)
+        i = self.match_sequence(i + 2, ('missionCommands', '.', 'addSubMenuForCoalition', '('))
+        if i is None:
+            return None
+        coalition, i = self.match_coalition(i)
+        if coalition is None or self.text_at(i) != ',' or self.kind_at(i + 1) != 'string':
+            return None
+        menu_name = lua_string_value(self.text_at(i + 1))
+        if self.text_at(i + 2) == ')':
+            # Leaving out the parent is the same as passing nil
+            parent = 'nil'
+            i = self.match_end_of_call(i + 2)
+        else:
+            parent = self.text_at(i + 3)
+            if self.text_at(i + 2) != ',' or (parent != 'nil' and parent not in self.bindings):
+                return None
+            i = self.match_end_of_call(i + 4)
+        if i is None:
+            return None
+
+        # A re-bound variable gets a fresh ID so each menu stays distinct
+        menu_id = variable
+        suffix = 1
+        while menu_id in self.menu_ids:
+            suffix += 1
+            menu_id = f"{variable}_{suffix}"
+        self.menu_ids.add(menu_id)
+        self.bindings[variable] = menu_id
+        return i, (menu_id, menu_name, self.bindings.get(parent, parent), coalition)
+
+    def match_command(self, i):
+        """Match `missionCommands.addCommandForCoalition(side, "Name", menu, handler, ...)`"""
+        if self.text_at(i) == 'local':
+            i += 1
+        if self.kind_at(i) == 'name' and self.text_at(i + 1) == '=':
+            i += 2
+        i = self.match_sequence(i, ('missionCommands', '.', 'addCommandForCoalition', '('))
+        if i is None:
+            return None
+        coalition, i = self.match_coalition(i)
+        if coalition is None or self.text_at(i) != ',' or self.kind_at(i + 1) != 'string':
+            return None
+        command_name = lua_string_value(self.text_at(i + 1))
+        variable = self.text_at(i + 3)
+        if self.text_at(i + 2) != ',' or variable not in self.bindings or self.text_at(i + 4) != ',':
+            return None
+
+        # Find the closing parenthesis and the top-level argument separators
+        first = i + 5
+        commas = []
+        depth = 0
+        i = first
+        while self.token(i) is not None:
+            if depth == 0 and self.text_at(i) in (',', ')'):
+                if self.text_at(i) == ')':
+                    break
+                commas.append(i)
+            depth += _block_delta(self.token(i))
+            i += 1
+        close = i
+        end = self.match_end_of_call(close)
+        if end is None or close == first:
+            return None
+
+        command = {'menu_id': self.bindings[variable], 'name': command_name}
+        handler_end = commas[0] if commas else close
+        if not commas and self.match_sequence(first, ('function', '(', ')')) and \
+                self.text_at(close - 1) == 'end':
+            body_tokens = [self.token(j) for j in range(first + 3, close - 1)]
+            body = self.text[self.token(first + 2)[3]:self.token(close - 1)[2]]
+            flag = self.match_flag_pulse(body_tokens)
+            if flag:
+                command['type'] = "Set Flag"
+                command['flag'], command['value'] = flag
+            else:
+                command['type'] = "Custom Code"
+                command['code'] = self.clean_body(body)
+        else:
+            handler = self.source(first, handler_end - 1)
+            args = self.source(commas[0] + 1, close - 1) if commas else ""
+            command['type'] = "Custom Code"
+            if handler in self.functions:
+                # Inline helpers defined at the top level of the script
+                params, body = self.functions[handler]
+                if not params.strip() and not args:
+                    command['code'] = self.clean_body(body)
+                else:
+                    command['code'] = f"(function({params}){body}end)({args})"
+            else:
+                if not all(self.kind_at(j) == 'name' or self.text_at(j) == '.'
+                           for j in range(first, handler_end)):
+                    handler = f"({handler})"
+                command['code'] = f"{handler}({args})"
+        return end, command
+
+    def source(self, first, last):
+        """Source text spanning tokens first..last inclusive"""
+        return self.text[self.token(first)[2]:self.token(last)[3]]
+
+    def match_flag_pulse(self, body_tokens):
+        """Return (flag, value) if the body is the generator's flag pulse, else None"""
+        flag = value = None
+        i = 0
+        for expected in FLAG_PULSE_PATTERN:
+            if i >= len(body_tokens):
+                return None
+            kind, text = body_tokens[i][0], body_tokens[i][1]
+            if expected == '{flag}':
+                if kind == 'string':
+                    text = lua_string_value(text)
+                elif kind != 'number':
+                    return None
+                if flag is not None and text != flag:
+                    return None
+                flag = text
+            elif expected == '{value}':
+                sign = 1
+                if text == '-':
+                    sign = -1
+                    i += 1
+                    if i >= len(body_tokens):
+                        return None
+                    kind, text = body_tokens[i][0], body_tokens[i][1]
+                if kind != 'number' or not isinstance(lua_number_value(text), int):
+                    return None
+                value = sign * lua_number_value(text)
+            elif text != expected:
+                return None
+            i += 1
+        rest = [tok[1] for tok in body_tokens[i:]]
+        if rest not in ([], [';']):
+            return None
+        return flag, value
+
+    @staticmethod
+    def clean_body(body):
+        # The generator pads custom code with one space on each side
+        if len(body) >= 2 and body[0] == ' ' and body[-1] == ' ':
+            return body[1:-1]
+        return textwrap.dedent(body).strip()
+
+    def add_custom_code(self, code):
+        self.pending_code.append((code, self.chunk_names))
+        self.wrapped_names.update(self.chunk_names)
+        self.chunk_names = set()
+        if self.menus:
+            self.flush_pending_code()
+
+    def flush_pending_code(self):
+        """Attach unrecognized code to the most recently defined menu"""
+        if not self.menus:
+            return
+        menu_id = self.menus[-1][0]
+        for code, names in self.pending_code:
+            self.imported_code_count += 1
+            self.wrapped_commands[len(self.commands)] = names
+            self.commands.append({
+                'menu_id': menu_id,
+                'name': f"Imported Code {self.imported_code_count}",
+                'type': "Custom Code",
+                'code': code
+            })
+        self.pending_code = []
+
+    def check_wrapped_references(self):
+        """Warn about commands that rely on code wrapped into "Imported Code" commands"""
+        for index, command in enumerate(self.commands):
+            if command['type'] != "Custom Code":
+                continue
+            # Each Imported Code command is its own closure, so it only sees what it defines
+            own_names = self.wrapped_commands.get(index, set())
+            missing = sorted((_referenced_names(command['code']) - own_names) & self.wrapped_names)
+            if missing:
+                self.warnings.append(
+                    f"Command '{command['name']}' uses {', '.join(missing)}, which the script "
+                    f"defines at the top level. That code was moved into an Imported Code "
+                    f"command, so it is not defined when this command runs.")
+
+def import_lua_menus(text):
+    """Return (menus, commands, warnings) reverse-compiled from a radio menu Lua script"""
+    return LuaMenuImporter(text).run()
+
+def new_command_id():
+    return uuid.uuid4().hex
+
+def ensure_command_ids(commands):
+    """Give every command without an ID a stable one.
+
+    Commands from older files get an ID derived from their menu, name and
+    position among same-named siblings, so every copy of the same file
+    agrees on it.
+    """
+    seen = {}
+    for command in commands:
+        if command.get('id'):
+            continue
+        slot = (command['menu_id'], command['name'])
+        seen[slot] = seen.get(slot, 0) + 1
+        digest = hashlib.sha1(f"{slot[0]}\0{slot[1]}\0{seen[slot]}".encode('utf-8'))
+        command['id'] = digest.hexdigest()[:32]
+    return commands
+
+def read_project_file(file_name):
+    """Load a saved menu JSON file and return (menus, commands)"""
+    with open(file_name, 'r') as f:
+        data = json.load(f)
+
+    # Validate the loaded data structure
+    if not isinstance(data, dict) or 'menus' not in data or 'commands' not in data:
+        raise ValueError("Invalid menu file format")
+
+    return [tuple(menu) for menu in data['menus']], ensure_command_ids(data['commands'])
+
+def write_project_file(file_name, menus, commands):
+    data = {
+        'menus': menus,
+        'commands': commands
+    }
+    with open(file_name, 'w') as f:
+        json.dump(data, f, indent=4)
+
+def project_nodes(menus, commands):
+    """Key every menu and command by its ID, with 'parent' holding the parent menu"""
+    nodes = {}
+    for menu_id, menu_name, submenu, coalition in menus:
+        nodes[('menu', menu_id)] = {'parent': submenu, 'name': menu_name, 'coalition': coalition}
+    for command in commands:
+        fields = {'parent': command['menu_id']}
+        fields.update((k, v) for k, v in command.items() if k not in ('id', 'menu_id'))
+        nodes[('command', command['id'])] = fields
+    return nodes
+
+def _out_of_order(keys, rank):
+    """Keys that have to move for `keys` to follow `rank`, outside their longest in-order run"""
+    tails = []
+    tail_index = []
+    previous = [None] * len(keys)
+    for i, key in enumerate(keys):
+        j = bisect.bisect_left(tails, rank[key])
+        if j:
+            previous[i] = tail_index[j - 1]
+        if j == len(tails):
+            tails.append(rank[key])
+            tail_index.append(i)
+        else:
+            tails[j] = rank[key]
+            tail_index[j] = i
+
+    in_order = set()
+    i = tail_index[-1] if tail_index else None
+    while i is not None:
+        in_order.add(i)
+        i = previous[i]
+    return [key for i, key in enumerate(keys) if i not in in_order]
+
+def diff_projects(old_menus, old_commands, new_menus, new_commands):
+    """Return the adds, deletes, moves and changes between two projects.
+
+    Each change is a dict with 'action', 'kind', 'id' and the 'old'/'new'
+    values involved. A move whose old and new parent are the same means
+    the node was reordered among its siblings.
+    """
+    old_nodes = project_nodes(old_menus, ensure_command_ids(old_commands))
+    new_nodes = project_nodes(new_menus, ensure_command_ids(new_commands))
+    changes = []
+    siblings = {}
+    for key, old in old_nodes.items():
+        new = new_nodes.get(key)
+        if new is None:
+            changes.append({'action': 'delete', 'kind': key[0], 'id': key[1], 'old': old, 'new': None})
+            continue
+        if old['parent'] != new['parent']:
+            changes.append({'action': 'move', 'kind': key[0], 'id': key[1],
+                            'old': old['parent'], 'new': new['parent']})
+        else:
+            siblings.setdefault((key[0], old['parent']), []).append(key)
+        fields = [f for f in dict.fromkeys([*old, *new]) if f != 'parent' and old.get(f) != new.get(f)]
+        if fields:
+            changes.append({'action': 'change', 'kind': key[0], 'id': key[1],
+                            'old': {f: old.get(f) for f in fields},
+                            'new': {f: new.get(f) for f in fields}})
+    for key, new in new_nodes.items():
+        if key not in old_nodes:
+            changes.append({'action': 'add', 'kind': key[0], 'id': key[1], 'old': None, 'new': new})
+
+    # Sibling order decides the order of the generated Lua, so reorders count as moves
+    new_rank = {key: i for i, key in enumerate(new_nodes)}
+    for (kind, parent), keys in siblings.items():
+        for key in _out_of_order(keys, new_rank):
+            changes.append({'action': 'move', 'kind': kind, 'id': key[1], 'old': parent, 'new': parent})
+    return changes
+
+def format_changes(changes):
+    """Render diff_projects output as one line per change"""
+    lines = []
+    for change in changes:
+        label = f"{change['kind']} {change['id']}"
+        node = change['new'] if change['action'] == 'add' else change['old']
+        if change['action'] in ('add', 'delete'):
+            sign = '+' if change['action'] == 'add' else '-'
+            lines.append(f"{sign} {label}: {node['name']} (in {node['parent']})")
+        elif change['action'] == 'move' and change['old'] == change['new']:
+            lines.append(f"> {label}: reordered within {change['old']}")
+        elif change['action'] == 'move':
+            lines.append(f"> {label}: moved from {change['old']} to {change['new']}")
+        else:
+            fields = ", ".join(f"{f}: {change['old'][f]!r} -> {change['new'][f]!r}" for f in change['old'])
+            lines.append(f"~ {label}: {fields}")
+    return "\n".join(lines)
+
+def _merge_value(base, ours, theirs):
+    """Three-way merge of one value, returning (value, conflicted)"""
+    if ours == theirs or theirs == base:
+        return ours, False
+    if ours == base:
+        return theirs, False
+    return ours, True
+
+def _merge_order(ours_keys, theirs_keys, merged_keys):
+    """Keep the order of ours_keys and slot the rest of theirs_keys in after the node they follow"""
+    ours_set = set(ours_keys)
+    following = {}
+    anchor = None
+    for key in theirs_keys:
+        if key not in ours_set:
+            following.setdefault(anchor, []).append(key)
+        anchor = key
+
+    order = []
+    for anchor in [None, *ours_keys]:
+        if anchor is not None:
+            order.append(anchor)
+        stack = list(reversed(following.get(anchor, [])))
+        while stack:
+            added = stack.pop()
+            order.append(added)
+            stack.extend(reversed(following.get(added, [])))
+
+    # Restored nodes that neither side kept go last
+    seen = set(order)
+    order.extend(key for key in merged_keys if key not in seen)
+    merged_set = set(merged_keys)
+    return [key for key in order if key in merged_set]
+
+def _merge_sibling_order(base_keys, ours_keys, theirs_keys, merged_keys):
+    """Three-way merge of one sibling group's order, returning (order, conflicting moves)"""
+    in_all = set(base_keys) & set(ours_keys) & set(theirs_keys)
+    base = [key for key in base_keys if key in in_all]
+    ours = [key for key in ours_keys if key in in_all]
+    theirs = [key for key in theirs_keys if key in in_all]
+
+    def moved(side):
+        if side == base:
+            return []
+        return _out_of_order(base, {key: i for i, key in enumerate(side)})
+
+    # Which nodes count as moved is ambiguous when both sides reorder, so
+    # different reorders on both sides keep our order and are reported
+    conflicting = []
+    theirs_moved = set()
+    if ours != theirs:
+        theirs_moved = set(moved(theirs))
+        if ours != base and theirs_moved:
+            conflicting = list(dict.fromkeys([*moved(ours), *moved(theirs)]))
+            theirs_moved = set()
+
+    # Nodes they moved are re-inserted after the node they follow on their side
+    ours_kept = [key for key in ours_keys if key not in theirs_moved]
+    return _merge_order(ours_kept, theirs_keys, merged_keys), conflicting
+
+def merge_projects(base, ours, theirs):
+    """Three-way merge of (menus, commands) projects keyed by menu and command ID.
+
+    Returns (menus, commands, conflicts). Conflicting edits keep our
+    version and are listed in conflicts.
+    """
+    versions = [project_nodes(menus, ensure_command_ids(commands)) for menus, commands in (base, ours, theirs)]
+    base_nodes, ours_nodes, theirs_nodes = versions
+    conflicts = []
+    merged = {}
+
+    for key in dict.fromkeys([*ours_nodes, *theirs_nodes, *base_nodes]):
+        b, o, t = base_nodes.get(key), ours_nodes.get(key), theirs_nodes.get(key)
+        if b is not None and o is not None and t is not None:
+            node = {}
+            for field in dict.fromkeys([*o, *t, *b]):
+                value, conflicted = _merge_value(b.get(field), o.get(field), t.get(field))
+                if conflicted:
+                    conflicts.append(f"{key[0]} {key[1]}: both sides changed '{field}' "
+                                     f"({o.get(field)!r} vs {t.get(field)!r}), kept ours")
+                if value is not None:
+                    node[field] = value
+        else:
+            node, conflicted = _merge_value(b, o, t)
+            if conflicted:
+                if o is None or t is None:
+                    reason = "deleted on one side and changed on the other"
+                else:
+                    reason = "added differently on both sides"
+                conflicts.append(f"{key[0]} {key[1]}: {reason}, kept ours")
+        if node is not None:
+            merged[key] = node
+
+    # Bring back menus that were deleted while the other side still uses them
+    pending = [node['parent'] for node in merged.values()]
+    while pending:
+        parent = pending.pop()
+        key = ('menu', parent)
+        if parent == "nil" or key in merged:
+            continue
+        restored = next((v[key] for v in (ours_nodes, theirs_nodes, base_nodes) if key in v), None)
+        if restored is None:
+            continue
+        conflicts.append(f"menu {parent}: deleted on one side but still in use, restored")
+        merged[key] = restored
+        pending.append(restored['parent'])
+
+    # Moves made on different sides can link menus into a loop
+    state = {}
+    for key in merged:
+        if key[0] != 'menu' or key in state:
+            continue
+        path = []
+        while key in merged and key not in state:
+            state[key] = 'visiting'
+            path.append(key)
+            key = ('menu', merged[key]['parent'])
+        if state.get(key) == 'visiting':
+            conflicts.append(f"menu {key[1]}: parent menus form a loop, moved to the top level")
+            merged[key]['parent'] = "nil"
+        for visited in path:
+            state[visited] = 'done'
+
+    # Sibling order decides the generated Lua, so merge it per (kind, parent) group.
+    # A node only counts as a sibling on a side where it had its merged parent,
+    # so a node moved to another menu takes its position from the side that moved it.
+    groups = [{} for _ in versions]
+    for nodes, side_groups in zip(versions, groups):
+        for key, node in nodes.items():
+            if key in merged and merged[key]['parent'] == node['parent']:
+                side_groups.setdefault((key[0], node['parent']), []).append(key)
+    members = {}
+    for key, node in merged.items():
+        members.setdefault((key[0], node['parent']), []).append(key)
+
+    order = []
+    for group in dict.fromkeys(
+            (key[0], merged[key]['parent']) for key in [*ours_nodes, *theirs_nodes, *merged] if key in merged):
+        group_order, reordered = _merge_sibling_order(*(side.get(group, []) for side in groups),
+                                                      members[group])
+        if reordered:
+            names = ", ".join(key[1] for key in reordered[:10])
+            if len(reordered) > 10:
+                names += f" and {len(reordered) - 10} more"
+            conflicts.append(f"{group[0]}s in {group[1]}: both sides reordered {names}, kept our order")
+        order.extend(group_order)
+
+    menus = []
+    commands = []
+    for key in order:
+        node = merged[key]
+        if key[0] == 'menu':
+            menus.append((key[1], node['name'], node['parent'], node['coalition']))
+        else:
+            command = {'id': key[1], 'menu_id': node['parent']}
+            command.update((k, v) for k, v in node.items() if k != 'parent')
+            commands.append(command)
+    return menus, commands, conflicts
+
+def run_cli(args):
+    """Command line entry point for comparing and merging saved menu files"""
+    parser = argparse.ArgumentParser(prog="Menu Editor.py",
+                                     description="Compare or merge saved radio menu files")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    diff_parser = subparsers.add_parser('diff', help="list the changes between two menu files")
+    diff_parser.add_argument('old')
+    diff_parser.add_argument('new')
+    merge_parser = subparsers.add_parser('merge', help="three-way merge of menu files")
+    merge_parser.add_argument('base')
+    merge_parser.add_argument('ours')
+    merge_parser.add_argument('theirs')
+    merge_parser.add_argument('-o', '--output', help="file to write the merged menu to")
+    options = parser.parse_args(args)
+
+    try:
+        if options.command == 'diff':
+            changes = diff_projects(*read_project_file(options.old), *read_project_file(options.new))
+            if changes:
+                print(format_changes(changes))
+            return 1 if changes else 0
+
+        menus, commands, conflicts = merge_projects(read_project_file(options.base),
+                                                    read_project_file(options.ours),
+                                                    read_project_file(options.theirs))
+        if options.output:
+            write_project_file(options.output, menus, commands)
+        else:
+            print(json.dumps({'menus': menus, 'commands': commands}, indent=4))
+        for conflict in conflicts:
+            print(f"CONFLICT {conflict}", file=sys.stderr)
+        return 1 if conflicts else 0
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
 class StyleSheet:
     MAIN_STYLE = """
         QMainWindow {
@@ -179,7 +1318,11 @@ class RadioMenuBuilder(QMainWindow):
         buttons = [
             ("Save Menu", self.save_project),
             ("Load Menu", self.load_project),
-            ("Export Lua Code", self.export_lua_code)
+            ("Import Lua", self.import_lua_code),
+            ("Compare Menu", self.compare_project),
+            ("Merge Menu", self.merge_project),
+            ("Export Lua Code", self.export_lua_code),
+            ("Export to Mission", self.export_to_miz)
         ]
         
         for text, callback in buttons:
@@ -355,6 +1498,7 @@ class RadioMenuBuilder(QMainWindow):
             return
         
         command_data = {
+            'id': new_command_id(),
             'menu_id': menu_id,
             'name': command_name,
             'type': action_type
@@ -432,71 +1576,7 @@ class RadioMenuBuilder(QMainWindow):
         self.structure_preview.expandAll()
 
     def update_lua_code(self):
-        lua_code = "-- Radio Menu Structure\n\n"
-        
-        # Helper function to get all commands for a specific menu
-        def get_menu_commands(menu_id):
-            return [cmd for cmd in self.commands if cmd['menu_id'] == menu_id]
-
-        # Helper function to get direct submenus of a menu
-        def get_direct_submenus(parent_id):
-            return [menu for menu in self.menus if menu[2] == parent_id]
-
-        # Helper function to generate menu and its commands recursively
-        def generate_menu_code(menu_data, processed_menus=None):
-            if processed_menus is None:
-                processed_menus = set()
-
-            menu_id, menu_name, submenu, coalition = menu_data
-            
-            # Skip if already processed
-            if menu_id in processed_menus:
-                return ""
-            
-            processed_menus.add(menu_id)
-            code = ""
-            
-            # Add the menu definition
-            coalition_str = f"coalition.side.{coalition.upper()}"
-            code += f"local {menu_id} = missionCommands.addSubMenuForCoalition({coalition_str}, \"{menu_name}\", {submenu})\n"
-            
-            # Add commands for this menu
-            menu_commands = get_menu_commands(menu_id)
-            for command in menu_commands:
-                if command['type'] == "Set Flag":
-                    flag = command['flag']
-                    # If flag can be converted to int, use it as is, otherwise keep as string
-                    try:
-                        flag = int(flag)
-                        flag_str = str(flag)  # No quotes for numbers
-                    except ValueError:
-                        flag_str = f"\"{flag}\""  # Quotes for strings
-                    
-                    code += (f"missionCommands.addCommandForCoalition({coalition_str}, "
-                            f"\"{command['name']}\", {menu_id}, function() "
-                            f"trigger.action.setUserFlag({flag_str}, {command['value']}); "
-                            f"timer.scheduleFunction(function() trigger.action.setUserFlag({flag_str}, 0) end, nil, timer.getTime() + 1) end)\n")
-                else:  # Custom Code
-                    code += (f"missionCommands.addCommandForCoalition({coalition_str}, "
-                            f"\"{command['name']}\", {menu_id}, function() {command['code']} end)\n")
-            
-            # Process submenus
-            submenus = get_direct_submenus(menu_id)
-            for submenu in submenus:
-                code += generate_menu_code(submenu, processed_menus)
-            
-            return code
-
-        # Start with top-level menus (those with submenu="nil")
-        top_level_menus = [menu for menu in self.menus if menu[2] == "nil"]
-        
-        # Add menus section
-        lua_code += "-- Menus\n"
-        for menu in top_level_menus:
-            lua_code += generate_menu_code(menu)
-        
-        # Update the text area
-        self.lua_code_output.setText(lua_code)
+        self.lua_code_output.setText(generate_lua_code(self.menus, self.commands))
 
     def copy_lua_code(self):
         clipboard = QApplication.clipboard()
@@ -512,14 +1592,8 @@ class RadioMenuBuilder(QMainWindow):
         )
         
         if file_name:
-            data = {
-                'menus': self.menus,
-                'commands': self.commands
-            }
-            
             try:
-                with open(file_name, 'w') as f:
-                    json.dump(data, f, indent=4)
+                write_project_file(file_name, self.menus, self.commands)
                 QMessageBox.information(self, "Success", "Menu saved successfully!")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Error saving menu: {str(e)}")
@@ -534,32 +1608,116 @@ class RadioMenuBuilder(QMainWindow):
         
         if file_name:
             try:
-                with open(file_name, 'r') as f:
-                    data = json.load(f)
-                
-                # Validate the loaded data structure
-                if not isinstance(data, dict) or 'menus' not in data or 'commands' not in data:
-                    raise ValueError("Invalid menu file format")
-                
-                self.menus = data['menus']
-                self.commands = data['commands']
-                
-                # Update UI
-                self.menu_dropdown.clear()
-                self.submenu_dropdown.clear()
-                self.submenu_dropdown.addItem("nil")
-                
-                for menu_id, _, _, _ in self.menus:
-                    self.menu_dropdown.addItem(menu_id)
-                    self.submenu_dropdown.addItem(menu_id)
-                
-                self.update_tree_view()
-                self.update_lua_code()
+                self.set_project(*read_project_file(file_name))
                 
                 QMessageBox.information(self, "Success", "Menu loaded successfully!")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Error loading menu: {str(e)}")
 
+    def import_lua_code(self):
+        file_name, _ = QFileDialog.getOpenFileName(
+            self,
+            "Import Lua Code",
+            "",
+            "Lua Files (*.lua);;All Files (*)"
+        )
+        
+        if file_name:
+            try:
+                with open(file_name, 'r', encoding='utf-8-sig') as f:
+                    menus, commands, warnings = import_lua_menus(f.read())
+                
+                self.set_project(menus, commands)
+                
+                if warnings:
+                    box = QMessageBox(QMessageBox.Warning, "Import Lua",
+                                      f"Lua code imported with {len(warnings)} warnings.",
+                                      QMessageBox.Ok, self)
+                    box.setDetailedText("\n".join(warnings))
+                    box.exec_()
+                else:
+                    QMessageBox.information(self, "Success", "Lua code imported successfully!")
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Error importing Lua code: {str(e)}")
+
+    def compare_project(self):
+        file_name, _ = QFileDialog.getOpenFileName(
+            self,
+            "Compare With Menu",
+            "",
+            "JSON files (*.json);;All Files (*)"
+        )
+        
+        if file_name:
+            try:
+                changes = diff_projects(*read_project_file(file_name), self.menus, self.commands)
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Error comparing menus: {str(e)}")
+                return
+            
+            if not changes:
+                QMessageBox.information(self, "Compare Menu", "No differences found.")
+                return
+            
+            box = QMessageBox(QMessageBox.Information, "Compare Menu",
+                              f"{len(changes)} changes since the selected file.", QMessageBox.Ok, self)
+            box.setDetailedText(format_changes(changes))
+            box.exec_()
+
+    def merge_project(self):
+        base_file, _ = QFileDialog.getOpenFileName(
+            self,
+            "Select Common Base Menu",
+            "",
+            "JSON files (*.json);;All Files (*)"
+        )
+        if not base_file:
+            return
+        
+        theirs_file, _ = QFileDialog.getOpenFileName(
+            self,
+            "Select Menu To Merge In",
+            "",
+            "JSON files (*.json);;All Files (*)"
+        )
+        if not theirs_file:
+            return
+        
+        try:
+            menus, commands, conflicts = merge_projects(read_project_file(base_file),
+                                                        (self.menus, self.commands),
+                                                        read_project_file(theirs_file))
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error merging menus: {str(e)}")
+            return
+        
+        self.set_project(menus, commands)
+        
+        if conflicts:
+            box = QMessageBox(QMessageBox.Warning, "Merge Menu",
+                              f"Merged with {len(conflicts)} conflicts. Your version was kept where both sides disagreed.",
+                              QMessageBox.Ok, self)
+            box.setDetailedText("\n".join(conflicts))
+            box.exec_()
+        else:
+            QMessageBox.information(self, "Success", "Menus merged successfully!")
+
+    def set_project(self, menus, commands):
+        """Replace the current menus and commands and refresh the UI"""
+        self.menus = menus
+        self.commands = ensure_command_ids(commands)
+        
+        self.menu_dropdown.clear()
+        self.submenu_dropdown.clear()
+        self.submenu_dropdown.addItem("nil")
+        
+        for menu_id, _, _, _ in self.menus:
+            self.menu_dropdown.addItem(menu_id)
+            self.submenu_dropdown.addItem(menu_id)
+        
+        self.update_tree_view()
+        self.update_lua_code()
+
     def export_lua_code(self):
         file_name, _ = QFileDialog.getSaveFileName(
             self,
@@ -579,6 +1737,27 @@ class RadioMenuBuilder(QMainWindow):
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to export Lua code: {str(e)}")
 
+    def export_to_miz(self):
+        file_name, _ = QFileDialog.getOpenFileName(
+            self,
+            "Export to Mission",
+            "",
+            "DCS Missions (*.miz);;All Files (*)"
+        )
+        
+        if file_name:
+            reply = QMessageBox.question(self, 'Mission Trigger',
+                                    'Also add a MISSION START trigger that loads the script?',
+                                    QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            
+            try:
+                inject_lua_into_miz(file_name, MIZ_SCRIPT_NAME,
+                                    self.lua_code_output.toPlainText(),
+                                    add_trigger=reply == QMessageBox.Yes)
+                QMessageBox.information(self, "Success", "Lua code exported to mission successfully!")
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to export to mission: {str(e)}")
+
     def reset_everything(self):
         # Ask for confirmation
         reply = QMessageBox.question(self, 'Confirmation',
@@ -700,6 +1879,9 @@ class RadioMenuBuilder(QMainWindow):
         return None
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ('diff', 'merge'):
+        sys.exit(run_cli(sys.argv[1:]))
+    
     app = QApplication(sys.argv)
     window = RadioMenuBuilder()
     window.show()